@@ -1,9 +1,97 @@
-from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
-from infer import ask_question, get_hint
+from typing import Optional
+from infer import ask_questions_batch, stream_answer, get_hint, warm_up, close_client, session_movies, SESSION_MAXSIZE
+import asyncio
+import orjson
 import uuid
 
-app = FastAPI()
+# -------------------------
+# Micro-batching of /ask calls
+# -------------------------
+MAX_BATCH = 8
+MAX_WAIT = 0.03  # seconds to wait for more questions before sending a batch
+
+ask_queue: asyncio.Queue = None  # (future, session_id, question) tuples
+_batcher_task: asyncio.Task = None
+_background_tasks = set()
+
+async def _answer_batch(batch):
+    try:
+        answers = await ask_questions_batch([(question, session_id) for _, session_id, question in batch])
+    except Exception as e:
+        answers = [e] * len(batch)
+    # Each waiter gets its own answer or error, so one failure doesn't 500 the rest.
+    for (future, _, _), answer in zip(batch, answers):
+        if future.done():
+            continue
+        if isinstance(answer, BaseException):
+            future.set_exception(answer)
+        else:
+            future.set_result(answer)
+
+async def _ask_batcher(queue):
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + MAX_WAIT
+        while len(batch) < MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        task = asyncio.create_task(_answer_batch(batch))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+def _get_ask_queue():
+    """Return the batching queue, starting the batcher on first use.
+
+    Started lazily so /ask also works where the lifespan never runs
+    (serverless handlers, TestClient without ``with``).
+    """
+    global ask_queue, _batcher_task
+    loop = asyncio.get_running_loop()
+    if _batcher_task is None or _batcher_task.done() or _batcher_task.get_loop() is not loop:
+        ask_queue = asyncio.Queue()
+        _batcher_task = asyncio.create_task(_ask_batcher(ask_queue))
+    return ask_queue
+
+async def _warm_up_prefix_cache():
+    try:
+        await warm_up()
+    except Exception:
+        pass  # warm-up is best effort; requests work without it
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _get_ask_queue()
+    warm_up_task = asyncio.create_task(_warm_up_prefix_cache())
+    _background_tasks.add(warm_up_task)
+    warm_up_task.add_done_callback(_background_tasks.discard)
+    yield
+    _batcher_task.cancel()
+    await close_client()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+def get_session_id(x_session_id: Optional[str] = Header(None)) -> str:
+    """Use the X-Session-ID header if it is a valid UUID, otherwise start a new session."""
+    try:
+        return str(uuid.UUID(x_session_id))
+    except (TypeError, ValueError):
+        return str(uuid.uuid4())
+
+def _is_game_over(answer: str) -> bool:
+    # Streamed replies are plain text, so the win is detected from the
+    # fixed rule-2 wording rather than a structured field.
+    resp_lower = answer.lower()
+    return resp_lower.startswith("yes") and "correct" in resp_lower
 
 class QuestionRequest(BaseModel):
     question: str
@@ -17,31 +105,69 @@ class HintResponse(BaseModel):
     hint: str
     session_id: str
 
+class StatsResponse(BaseModel):
+    active_sessions: int
+    max_sessions: int
+
 @app.post("/ask", response_model=AnswerResponse)
-async def ask_movie_question(request: QuestionRequest, http_request: Request):
+async def ask_movie_question(request: QuestionRequest, session_id: str = Depends(get_session_id)):
     if not request.question.strip():
         raise HTTPException(status_code=400, detail="Question must not be empty.")
 
-    session_id = http_request.headers.get("X-Session-ID")
-    if not session_id:
-        session_id = str(uuid.uuid4())
-
     try:
-        answer = ask_question(request.question, session_id)
-        resp_lower = answer.lower()
-        game_over = resp_lower.startswith("yes") and "correct" in resp_lower
-        return {"answer": answer, "game_over": game_over, "session_id": session_id}
+        future = asyncio.get_running_loop().create_future()
+        await _get_ask_queue().put((future, session_id, request.question))
+        result = await future
+        return {"answer": result["text"], "game_over": result["is_guess_correct"], "session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/hint", response_model=HintResponse)
-async def get_movie_hint(http_request: Request):
-    session_id = http_request.headers.get("X-Session-ID")
-    if not session_id:
-        session_id = str(uuid.uuid4())
+@app.post("/ask/stream")
+async def ask_movie_question_stream(request: QuestionRequest, session_id: str = Depends(get_session_id)):
+    """Server-sent events: one {"delta": ...} event per chunk, then a final
+    {"game_over": ..., "session_id": ...} event."""
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question must not be empty.")
 
+    async def events():
+        parts = []
+        try:
+            async for delta in stream_answer(request.question, session_id):
+                parts.append(delta)
+                yield b"data: " + orjson.dumps({"delta": delta}) + b"\n\n"
+        except Exception as e:
+            yield b"data: " + orjson.dumps({"error": str(e), "session_id": session_id}) + b"\n\n"
+            return
+        game_over = _is_game_over("".join(parts).strip())
+        yield b"data: " + orjson.dumps({"game_over": game_over, "session_id": session_id}) + b"\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.get("/hint", response_model=HintResponse)
+async def get_movie_hint(session_id: str = Depends(get_session_id)):
     try:
-        hint = get_hint(session_id)
+        hint = await get_hint(session_id)
         return {"hint": hint, "session_id": session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/stats", response_model=StatsResponse)
+async def get_stats():
+    session_movies.expire()  # drop idle sessions so the count is current
+    return {"active_sessions": len(session_movies), "max_sessions": SESSION_MAXSIZE}
+
+if __name__ == "__main__":
+    import os
+    import uvicorn
+
+    uvicorn.run(
+        "api:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+        # Sessions, cached answers and the batch queue live in this process, so
+        # extra workers would give one session a different movie per worker.
+        # Only raise WEB_CONCURRENCY once session state moves out of process.
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
@@ -0,0 +1,117 @@
+"""Offline build of the movie sample served by infer.py.
+
+Run ``python build_movies.py`` to download the datasets, sample and normalize
+the movies, and write them to movies.pkl. The API then only has to unpickle a
+list of dicts at startup and never imports polars or datasets; those are
+listed in requirements-build.txt and only imported while building.
+"""
+import os, pickle, tempfile
+import orjson
+
+MOVIES_CACHE_PATH = os.getenv(
+    "MOVIES_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "movies.pkl"),
+)
+
+# -------------------------
+# Load datasets and prepare DataFrames
+# -------------------------
+def _build_combined_df():
+    import polars as pl
+    from datasets import load_dataset
+
+    ds = load_dataset("AiresPucrs/tmdb-5000-movies", split="train")
+    data = ds.to_dict()
+    df_tmdb = pl.DataFrame(data).with_columns([
+        pl.col("popularity").cast(pl.Float64, strict=False)
+    ]).sort("popularity", descending=True).head(150)
+
+    df_tmdb_filtered = df_tmdb.select([
+        pl.col("title").cast(pl.Utf8),
+        pl.col("release_date").cast(pl.Utf8),
+        pl.col("genres").cast(pl.Utf8),
+        pl.col("overview").cast(pl.Utf8),
+    ]).with_columns([
+        pl.lit(None).cast(pl.Utf8).alias("director")
+    ])
+
+    bollywood_csv_url = "https://raw.githubusercontent.com/devensinghbhagtani/Bollywood-Movie-Dataset/main/IMDB-Movie-Dataset(2023-1951).csv"
+    df_bollywood = pl.read_csv(bollywood_csv_url, ignore_errors=True)
+    df_bollywood = df_bollywood.with_columns(
+        pl.col("year").cast(pl.Int64)
+    )
+    df_bollywood_filtered = df_bollywood.filter(
+        (pl.col("year") >= 2006) & (pl.col("year") <= 2019)
+    )
+
+    df_bollywood = df_bollywood_filtered.select([
+        pl.col("movie_name").alias("title").cast(pl.Utf8),
+        pl.col("year").alias("release_date").cast(pl.Utf8),
+        pl.col("genre").alias("genres").cast(pl.Utf8),
+        pl.col("overview").cast(pl.Utf8),
+        pl.col("director").cast(pl.Utf8),
+    ]).with_columns([
+        pl.lit("Hindi").alias("language")
+    ])
+    df_tmdb_simple = df_tmdb_filtered.select([
+        "title",
+        "release_date",
+        "genres",
+        "overview",
+    ]).with_columns([
+        pl.lit(None).cast(pl.Utf8).alias("director"),
+        pl.lit("English").alias("language")
+    ])
+
+    df_bollywood_sample = df_bollywood.sample(n=150, seed=24)
+    df_tmdb_sample = df_tmdb_simple.sample(n=150, seed=24)
+    return pl.concat([df_tmdb_sample, df_bollywood_sample]).sample(fraction=1.0, shuffle=True)
+
+# -------------------------
+# Helpers
+# -------------------------
+def safe_load_json(s):
+    """Parse a JSON string leniently; shared with infer.py for Groq replies."""
+    if s is None:
+        return []
+    if isinstance(s, (list, dict)):
+        return s
+    try:
+        return orjson.loads(s)
+    except Exception:
+        return []
+
+def _normalize_movie(movie):
+    """Parse the JSON columns and lowercase the title/language once per row."""
+    cast_list = [c.get("name") for c in safe_load_json(movie.get("cast")) if isinstance(c, dict)]
+    crew = safe_load_json(movie.get("crew"))
+    movie["title_lc"] = (movie.get("title") or "").lower()
+    movie["language_lc"] = (movie.get("language") or "").lower()
+    movie["genres_list"] = [g.get("name") for g in safe_load_json(movie.get("genres")) if isinstance(g, dict)]
+    movie["main_cast"] = cast_list[:6]
+    movie["directors"] = [c.get("name") for c in crew if isinstance(c, dict) and c.get("job") and c.get("job").lower() == "director"]
+    return movie
+
+# -------------------------
+# Public functions
+# -------------------------
+def build_movies():
+    """Return the sampled movies as plain, pre-normalized dicts."""
+    return [_normalize_movie(row) for row in _build_combined_df().to_dicts()]
+
+def save_movies(movies, path=MOVIES_CACHE_PATH):
+    # Write to a temp file unique to this call, then rename, so concurrently
+    # starting workers never read a partial or interleaved file.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(movies, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+if __name__ == "__main__":
+    movies = build_movies()
+    save_movies(movies)
+    print(f"Wrote {len(movies)} movies to {MOVIES_CACHE_PATH}")
@@ -1,87 +1,71 @@
-import json, io, uuid
-import polars as pl
-from datasets import load_dataset
-import requests
-from groq import Groq
+import asyncio, random, pickle
+import httpx
+from groq import AsyncGroq, DefaultAsyncHttpxClient
+from cachetools import TTLCache
 import os
 from dotenv import load_dotenv
+from build_movies import MOVIES_CACHE_PATH, build_movies, safe_load_json, save_movies
 
 # -------------------------
-# Load datasets and prepare DataFrames
+# Load the prebuilt movie sample
 # -------------------------
-ds = load_dataset("AiresPucrs/tmdb-5000-movies", split="train")
-data = ds.to_dict()
-df_tmdb = pl.DataFrame(data).with_columns([
-    pl.col("popularity").cast(pl.Float64, strict=False)
-]).sort("popularity", descending=True).head(150)
-
-df_tmdb_filtered = df_tmdb.select([
-    pl.col("title").cast(pl.Utf8),
-    pl.col("release_date").cast(pl.Utf8),
-    pl.col("genres").cast(pl.Utf8),
-    pl.col("overview").cast(pl.Utf8),
-]).with_columns([
-    pl.lit(None).cast(pl.Utf8).alias("director")
-])
-
-bollywood_csv_url = "https://raw.githubusercontent.com/devensinghbhagtani/Bollywood-Movie-Dataset/main/IMDB-Movie-Dataset(2023-1951).csv"
-response = requests.get(bollywood_csv_url)
-response.raise_for_status()
-
-df_bollywood = pl.read_csv(io.BytesIO(response.content), ignore_errors=True)
-df_bollywood = df_bollywood.with_columns(
-    pl.col("year").cast(pl.Int64)
-)
-df_bollywood_filtered = df_bollywood.filter(
-    (pl.col("year") >= 2006) & (pl.col("year") <= 2019)
-)
-
-df_bollywood = df_bollywood_filtered.select([
-    pl.col("movie_name").alias("title").cast(pl.Utf8),
-    pl.col("year").alias("release_date").cast(pl.Utf8),
-    pl.col("genre").alias("genres").cast(pl.Utf8),
-    pl.col("overview").cast(pl.Utf8),
-    pl.col("director").cast(pl.Utf8),
-]).with_columns([
-    pl.lit("Hindi").alias("language")
-])
-df_tmdb_simple = df_tmdb_filtered.select([
-    "title",
-    "release_date",
-    "genres",
-    "overview",
-]).with_columns([
-    pl.lit(None).cast(pl.Utf8).alias("director"),
-    pl.lit("English").alias("language")
-])
-
-df_bollywood_sample = df_bollywood.sample(n=150, seed=24)
-df_tmdb_sample = df_tmdb_simple.sample(n=150, seed=24)
-combined_df = pl.concat([df_tmdb_sample, df_bollywood_sample]).sample(fraction=1.0, shuffle=True)
+if os.path.exists(MOVIES_CACHE_PATH):
+    with open(MOVIES_CACHE_PATH, "rb") as f:
+        MOVIES = pickle.load(f)  # pre-normalized rows, see build_movies.py
+else:
+    # No prebuilt file (local dev): build in-process with requirements-build.txt.
+    try:
+        MOVIES = build_movies()
+    except ImportError as e:
+        raise RuntimeError(
+            f"{MOVIES_CACHE_PATH} not found; install requirements-build.txt and run `python build_movies.py`"
+        ) from e
+    try:
+        save_movies(MOVIES, MOVIES_CACHE_PATH)
+    except OSError:
+        pass  # read-only filesystem; rebuild on next start
 
 # -------------------------
 # Session store for movies
 # -------------------------
-session_movies = {}  # {session_id: movie_dict}
+SESSION_MAXSIZE = 10_000
+SESSION_TTL = 3600  # seconds since the session's last request
+
+# {session_id: {"movie": movie_dict, "facts": str, "movie_prompt": str,
+#               "ask_prefix": str, "stream_prefix": str, "answers": {question: answer},
+#               "hint": str (once generated)}}
+# Bounded so idle or spoofed session ids are eventually evicted; every access
+# re-inserts the entry (see get_or_create_movie) so active games never expire.
+session_movies = TTLCache(maxsize=SESSION_MAXSIZE, ttl=SESSION_TTL)
+
+# Asks run at temperature 0, so a repeated question gets the stored answer
+# without another Groq call. Kept per session so answers expire with its movie.
+MAX_ANSWERS_PER_SESSION = 100
 
 # -------------------------
 # Helpers
 # -------------------------
-def _safe_load_json(s):
-    if s is None:
-        return []
-    if isinstance(s, (list, dict)):
-        return s
-    try:
-        return json.loads(s)
-    except Exception:
-        return []
+# Kept byte-identical across requests (and ahead of any movie-specific text)
+# so Groq can reuse the cached prefill for this prefix.
+STATIC_SYSTEM_HEADER = """
+You answer questions about a hidden movie using only its hidden title and the facts below.
 
-def get_or_create_movie(session_id: str):
-    if session_id not in session_movies:
-        selected_df = combined_df.sample(n=1)
-        session_movies[session_id] = selected_df.to_dicts()[0]
-    return session_movies[session_id]
+RULES:
+1. If the user guesses the movie (e.g. "is it X?"), compare the guess case-insensitively to the hidden title and its franchise.
+2. Correct guess: "Yes, that is correct! The movie is <hidden title>."
+3. Wrong guess: "No, that is not the movie or its franchise."
+4. Other questions answerable from the facts: "Yes" or "No".
+5. Fact not provided: "I don't have that information."
+6. Never reveal the title unless the guess is correct.
+"""
+
+JSON_ANSWER_FORMAT = (
+    'Respond ONLY with compact JSON: '
+    '{"is_guess_correct": true|false, "text": "<reply per the rules>"}\n'
+    '"is_guess_correct" decides whether the game ends: set it to true ONLY when the question names a specific '
+    'movie title and that title matches the hidden title or franchise (rule 2). It MUST be false for every '
+    'other question, including questions answered "Yes".\n'
+)
 
 def build_facts_and_instruction(movie):
     overview = movie.get("overview") or ""
@@ -91,12 +75,9 @@ def build_facts_and_instruction(movie):
     vote_average = movie.get("vote_average") or ""
     vote_count = movie.get("vote_count") or ""
 
-    genres_list = [g.get("name") for g in _safe_load_json(movie.get("genres")) if isinstance(g, dict)]
-    cast_list = [c.get("name") for c in _safe_load_json(movie.get("cast")) if isinstance(c, dict)]
-    main_cast = cast_list[:6] if cast_list else []
-    crew = _safe_load_json(movie.get("crew"))
-    directors = [c.get("name") for c in crew if isinstance(c, dict) and c.get("job") and c.get("job").lower() == "director"]
-    directors = directors or []
+    genres_list = movie["genres_list"]
+    main_cast = movie["main_cast"]
+    directors = movie["directors"]
 
     facts = [
         f"Overview: {overview.strip() or 'N/A'}",
@@ -112,60 +93,227 @@ def build_facts_and_instruction(movie):
 
     facts_block = "\n".join(facts)
 
-    system_instruction = f"""
-You are an assistant that answers only 'Yes' or 'No' about a hidden movie
-based on the factual information provided in the 'Movie facts' section below.
+    movie_instruction = (
+        f'Hidden title: "{movie["title_lc"]}"\n'
+        f'Hidden language: "{movie["language_lc"]}"'
+    )
+    return facts_block, movie_instruction
 
-RULES:
-1. If the user explicitly guesses the movie (e.g., "is the movie X?" or "is it X?"),
-   compare their guess (case-insensitive) to the hidden title and hidden franchise.
-2. If the guess matches exactly or clearly refers to the correct franchise, respond:
-   "Yes, that is correct! The movie is {movie.get("title").lower()}."
-3. If the guess is incorrect, respond:
-   "No, that is not the movie or its franchise."
-4. For other questions that can be answered with the provided facts, respond only with "Yes" or "No".
-5. If the fact is missing from the provided facts, respond "I don't have that information."
-6. Never provide extra explanations or reveal the title unless the user explicitly asks or guesses correctly.
-
-The movie title is: "{movie.get("title").lower()}"
-The movie language is: "{movie.get("language").lower()}"
-"""
-    return facts_block, system_instruction
+def get_or_create_movie(session_id: str):
+    """Return the session entry, building its prompt pieces once on first use."""
+    if session_id not in session_movies:
+        movie = random.choice(MOVIES)
+        facts_block, movie_instruction = build_facts_and_instruction(movie)
+        # Everything up to the user question is fixed for the session, so
+        # each prompt is a single concatenation with the question.
+        movie_prompt = movie_instruction + "\n\nMovie facts:\n" + facts_block + "\n\nUser question: "
+        session_movies[session_id] = {
+            "movie": movie,
+            "facts": facts_block,
+            "movie_prompt": movie_prompt,
+            "ask_prefix": STATIC_SYSTEM_HEADER + JSON_ANSWER_FORMAT + "\n" + movie_prompt,
+            "stream_prefix": STATIC_SYSTEM_HEADER + "\n" + movie_prompt,
+            "answers": {},
+        }
+    else:
+        # Re-assigning restarts the entry's TTL, so expiry counts from last use.
+        session_movies[session_id] = session_movies[session_id]
+    return session_movies[session_id]
 
 # -------------------------
 # LLM client
 # -------------------------
-load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+_client: AsyncGroq = None
+_client_loop: asyncio.AbstractEventLoop = None
+
+def get_client():
+    """Return the Groq client for the running event loop, building it on first use.
+
+    Every call on a loop shares one connection pool. Pooled connections belong
+    to the loop that opened them, so a new loop (serverless handlers, TestClient
+    without ``with``) gets a fresh client, like the /ask batcher in api.py.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        load_dotenv()
+        _client = AsyncGroq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+                http2=True,
+            ),
+        )
+        _client_loop = loop
+    return _client
 
 # -------------------------
 # Public functions
 # -------------------------
-def ask_question(user_question: str, session_id: str):
-    movie = get_or_create_movie(session_id)
-    facts_block, system_instruction = build_facts_and_instruction(movie)
+async def close_client():
+    """Close the shared client's connection pool, if it was ever created."""
+    global _client, _client_loop
+    if _client is not None:
+        await _client.close()
+        _client, _client_loop = None, None
+
+async def warm_up():
+    """Send the static header once so the provider's prefix cache is primed."""
+    await get_client().chat.completions.create(
+        model="gemma2-9b-it",
+        messages=[{"role": "user", "content": STATIC_SYSTEM_HEADER + JSON_ANSWER_FORMAT}],
+        temperature=0.0,
+        max_completion_tokens=1,
+        top_p=1,
+        stream=False,
+        stop=None
+    )
+
+# The helpers below take the session entry itself, fetched once before any
+# await: if the session is evicted during a Groq call, the answer must still
+# land on the entry (and movie) it was asked about, not on a fresh session.
+def _build_ask_prompt(user_question: str, session, json_answer: bool = True):
+    prefix = session["ask_prefix"] if json_answer else session["stream_prefix"]
+    return prefix + user_question.strip().lower()
+
+def _cached_answer(user_question: str, session):
+    return session["answers"].get(user_question.strip().lower())
+
+def _store_answer(user_question: str, session, answer):
+    answers = session["answers"]
+    if len(answers) >= MAX_ANSWERS_PER_SESSION:
+        answers.pop(next(iter(answers)))  # drop the oldest
+    answers[user_question.strip().lower()] = answer
+
+def _parse_answer(entry):
+    """Turn a structured reply into {"text": str, "is_guess_correct": bool}."""
+    if not isinstance(entry, dict) or not isinstance(entry.get("text"), str):
+        return None
+    return {"text": entry["text"].strip(), "is_guess_correct": entry.get("is_guess_correct") is True}
+
+async def ask_question(user_question: str, session_id: str):
+    return await _ask_one(user_question, get_or_create_movie(session_id))
+
+async def _ask_one(user_question: str, session):
+    cached = _cached_answer(user_question, session)
+    if cached is not None:
+        return cached
+
+    prompt = _build_ask_prompt(user_question, session)
+
+    completion = await get_client().chat.completions.create(
+        model="gemma2-9b-it",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.0,
+        max_completion_tokens=40,  # {"is_guess_correct", "text"} incl. the correct-guess sentence with a long title
+        top_p=1,
+        stream=False,
+        stop=None,
+        response_format={"type": "json_object"}
+    )
+    content = completion.choices[0].message.content.strip()
+    answer = _parse_answer(safe_load_json(content))
+    if answer is None:
+        # Unparsed reply: return it as-is but don't cache it, so the next ask retries.
+        return {"text": content, "is_guess_correct": False}
+    _store_answer(user_question, session, answer)
+    return answer
+
+async def stream_answer(user_question: str, session_id: str):
+    """Yield the answer text piece by piece as the model produces it.
+
+    Uses plain-text replies (JSON mode would stream raw JSON fragments).
+    """
+    prompt = _build_ask_prompt(user_question, get_or_create_movie(session_id), json_answer=False)
+
+    stream = await get_client().chat.completions.create(
+        model="gemma2-9b-it",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.0,
+        max_completion_tokens=32,  # enough for the correct-guess sentence with a long title
+        top_p=1,
+        stream=True,
+        stop=["\n"]
+    )
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            yield delta
+
+async def ask_questions_batch(items):
+    """Answer several (user_question, session_id) pairs with a single completion.
+
+    Returns one entry per item, in order: an ``ask_question``-style result, or
+    the exception raised while answering that item, so one failure does not
+    fail the rest of the batch. Cached answers are reused; only the remaining
+    questions are sent to the model, and any it fails to answer in the batched
+    reply (or all of them, if the batched call itself fails) are retried on
+    their own.
+    """
+    asks = [(user_question, get_or_create_movie(session_id)) for user_question, session_id in items]
+    results = [_cached_answer(*ask) for ask in asks]
+    pending = [i for i, result in enumerate(results) if result is None]
+    if pending:
+        answers = await _ask_uncached_batch([asks[i] for i in pending])
+        for i, answer in zip(pending, answers):
+            results[i] = answer
+    return results
+
+async def _ask_uncached_batch(items):
+    answers = {}
+    if len(items) > 1:
+        try:
+            answers = await _ask_combined(items)
+        except Exception:
+            pass  # e.g. rate limit or invalid JSON; answer each question on its own
+
+    missing = [i for i in range(1, len(items) + 1) if i not in answers]
+    retried = await asyncio.gather(*(_ask_one(*items[i - 1]) for i in missing), return_exceptions=True)
+    answers.update(zip(missing, retried))
+    return [answers[i] for i in range(1, len(items) + 1)]
+
+async def _ask_combined(items):
+    """Ask all (user_question, session) items in one prompt; return {id: answer} for the ones it answered."""
+    sections = []
+    for i, (user_question, session) in enumerate(items, start=1):
+        sections.append(f"### Question #{i}\n" + session["movie_prompt"] + user_question.strip().lower())
 
     prompt = (
-        system_instruction + "\n\n"
-        "Movie facts:\n"
-        f"{facts_block}\n\n"
-        f"User question: {user_question.strip().lower()}"
+        STATIC_SYSTEM_HEADER + JSON_ANSWER_FORMAT + "\n"
+        f"You will receive {len(items)} independent questions, numbered #1 to #{len(items)}.\n"
+        "Each question concerns its own hidden movie, title and facts.\n"
+        "Answer every question following the rules above and only the facts given in its section.\n"
+        'Put one reply object per question, with its "id" added, in a JSON object: '
+        '{"answers": [{"id": 1, "is_guess_correct": ..., "text": "..."}, ...]}\n\n'
+        + "\n\n".join(sections)
     )
 
-    completion = client.chat.completions.create(
+    completion = await get_client().chat.completions.create(
         model="gemma2-9b-it",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.0,
-        max_completion_tokens=50,
+        max_completion_tokens=44 * len(items),  # per-question reply plus its "id" and list punctuation
         top_p=1,
         stream=False,
-        stop=None
+        stop=None,
+        response_format={"type": "json_object"}
     )
-    return completion.choices[0].message.content.strip()
 
-def get_hint(session_id: str):
-    movie = get_or_create_movie(session_id)
-    facts_block, _ = build_facts_and_instruction(movie)
+    answers = {}
+    parsed = safe_load_json(completion.choices[0].message.content.strip())
+    for entry in parsed.get("answers", []) if isinstance(parsed, dict) else []:
+        answer = _parse_answer(entry)
+        if answer is not None and isinstance(entry.get("id"), int) and 1 <= entry["id"] <= len(items):
+            answers[entry["id"]] = answer
+            _store_answer(*items[entry["id"] - 1], answer)
+    return answers
+
+async def get_hint(session_id: str):
+    # One hint per session, so repeated /hint polls skip the Groq call.
+    session = get_or_create_movie(session_id)
+    if "hint" in session:
+        return session["hint"]
+    facts_block = session["facts"]
 
     hint_prompt = f"""
 You are an assistant helping someone guess a hidden movie based on the following factual information. 
@@ -176,7 +324,7 @@ Movie facts:
 
 Hint:
 """
-    hint_completion = client.chat.completions.create(
+    hint_completion = await get_client().chat.completions.create(
         model="gemma2-9b-it",
         messages=[{"role": "user", "content": hint_prompt}],
         temperature=0.7,
@@ -185,4 +333,5 @@ Hint:
         stream=False,
         stop=None
     )
-    return hint_completion.choices[0].message.content.strip()
+    session["hint"] = hint_completion.choices[0].message.content.strip()
+    return session["hint"]
@@ -0,0 +1,25 @@
+import os, pickle, sys, tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# infer.py loads the movie sample at import time; point it at a tiny prebuilt
+# pickle so tests never download datasets or need polars.
+MOVIES = [
+    {
+        "title": title,
+        "language": "English",
+        "overview": overview,
+        "release_date": "2010",
+        "title_lc": title.lower(),
+        "language_lc": "english",
+        "genres_list": ["Drama"],
+        "main_cast": [],
+        "directors": [],
+    }
+    for title, overview in [("Inception", "Dreams within dreams."), ("Up", "A flying house.")]
+]
+_movies_path = os.path.join(tempfile.mkdtemp(), "movies.pkl")
+with open(_movies_path, "wb") as f:
+    pickle.dump(MOVIES, f)
+os.environ["MOVIES_CACHE_PATH"] = _movies_path
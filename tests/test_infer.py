@@ -0,0 +1,129 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+import orjson
+import pytest
+
+import infer
+
+
+class StubClient:
+    """Stands in for AsyncGroq; ``respond(prompt)`` returns reply text or raises."""
+
+    def __init__(self, respond):
+        self.prompts = []
+        self.respond = respond
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        prompt = kwargs["messages"][0]["content"]
+        self.prompts.append(prompt)
+        content = self.respond(prompt)
+        if isinstance(content, bytes):
+            content = content.decode()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def is_batch(prompt):
+    return '"answers"' in prompt
+
+def question_of(prompt):
+    return re.findall(r"User question: (.*)", prompt)[-1]
+
+def reply(text, is_guess_correct=False, **extra):
+    return {**extra, "is_guess_correct": is_guess_correct, "text": text}
+
+ITEMS = [("q1", "s1"), ("q2", "s2"), ("q3", "s3")]
+
+
+@pytest.fixture(autouse=True)
+def clear_sessions():
+    infer.session_movies.clear()
+
+
+def run_batch(monkeypatch, respond, items=ITEMS):
+    client = StubClient(respond)
+    monkeypatch.setattr(infer, "get_client", lambda: client)
+    return asyncio.run(infer.ask_questions_batch(items)), client
+
+
+def test_partial_batch_reply_retries_only_missing(monkeypatch):
+    def respond(prompt):
+        if is_batch(prompt):
+            return orjson.dumps({"answers": [reply("Yes", id=1), reply("No", id=3)]})
+        return orjson.dumps(reply(f"retried {question_of(prompt)}"))
+
+    results, client = run_batch(monkeypatch, respond)
+
+    assert [r["text"] for r in results] == ["Yes", "retried q2", "No"]
+    assert len(client.prompts) == 2
+
+
+def test_garbled_batch_reply_retries_every_question(monkeypatch):
+    def respond(prompt):
+        if is_batch(prompt):
+            return "not json at all"
+        return orjson.dumps(reply(f"retried {question_of(prompt)}"))
+
+    results, client = run_batch(monkeypatch, respond)
+
+    assert [r["text"] for r in results] == ["retried q1", "retried q2", "retried q3"]
+    assert len(client.prompts) == 4
+
+
+def test_failing_batch_call_falls_back_to_single_questions(monkeypatch):
+    def respond(prompt):
+        if is_batch(prompt):
+            raise RuntimeError("rate limited")
+        return orjson.dumps(reply(f"retried {question_of(prompt)}"))
+
+    results, _ = run_batch(monkeypatch, respond)
+
+    assert [r["text"] for r in results] == ["retried q1", "retried q2", "retried q3"]
+
+
+def test_failing_retry_only_fails_its_own_question(monkeypatch):
+    def respond(prompt):
+        if is_batch(prompt):
+            return orjson.dumps({"answers": [reply("Yes", id=1)]})
+        if question_of(prompt) == "q2":
+            raise RuntimeError("boom")
+        return orjson.dumps(reply(f"retried {question_of(prompt)}"))
+
+    results, _ = run_batch(monkeypatch, respond)
+
+    assert results[0]["text"] == "Yes"
+    assert isinstance(results[1], RuntimeError)
+    assert results[2]["text"] == "retried q3"
+
+
+def test_unparsed_reply_is_not_cached(monkeypatch):
+    replies = iter(["garbled", orjson.dumps(reply("No"))])
+
+    results, _ = run_batch(monkeypatch, lambda prompt: next(replies), items=[("q1", "s1")])
+    assert results[0]["text"] == "garbled"
+
+    results, client = run_batch(monkeypatch, lambda prompt: next(replies), items=[("q1", "s1")])
+    assert results[0]["text"] == "No"
+    assert len(client.prompts) == 1
+
+
+def test_game_over_follows_is_guess_correct_flag(monkeypatch):
+    def respond(prompt):
+        return orjson.dumps(reply("Yes! You got it", is_guess_correct=True))
+
+    results, _ = run_batch(monkeypatch, respond, items=[("is it inception?", "s1")])
+
+    assert results[0] == {"text": "Yes! You got it", "is_guess_correct": True}
+
+
+def test_answer_is_not_cached_on_a_session_recreated_mid_call(monkeypatch):
+    def respond(prompt):
+        infer.session_movies.clear()  # session evicted while the call is in flight
+        return orjson.dumps(reply("Yes, that is correct!", is_guess_correct=True))
+
+    results, _ = run_batch(monkeypatch, respond, items=[("is it up?", "s1")])
+
+    assert results[0]["is_guess_correct"] is True
+    assert "s1" not in infer.session_movies